@@ -9,14 +9,15 @@ max, and miss count. Optional CSV dump and real-time scheduling.
 Author: MIT Licensed
 """
 import argparse
-import csv
+import collections
 import os
+import select
 import signal
 import sys
 import threading
 import time
 import queue
-from typing import Tuple, Any, Optional, List, Union
+from typing import Tuple, Any, Optional, Sequence, Union
 from dataclasses import dataclass
 
 try:
@@ -25,6 +26,11 @@ except ImportError:
     print("ERROR: numpy required. Install with: pip install numpy", file=sys.stderr)
     sys.exit(1)
 
+try:
+    from numba import get_num_threads, njit, prange
+except ImportError:  # optional accelerator (pip install .[jit])
+    njit = None
+
 
 def now_ns() -> int:
     """Monotonic high-resolution timestamp in ns."""
@@ -66,6 +72,135 @@ def set_realtime_priority() -> bool:
     return False
 
 
+def pin_measurement_threads(toggler: threading.Thread, listener: threading.Thread) -> bool:
+    """
+    Pin the toggler and listener to the last two allowed CPUs and the calling (main)
+    thread to the first. Returns True if successful.
+    """
+    try:
+        cpus = sorted(os.sched_getaffinity(0))
+        if len(cpus) < 3:
+            print(f"⚠ CPU affinity needs at least 3 CPUs, have {len(cpus)}; not pinning")
+            return False
+        
+        main_cpu, tg_cpu, lg_cpu = cpus[0], cpus[-2], cpus[-1]
+        os.sched_setaffinity(toggler.native_id, {tg_cpu})
+        os.sched_setaffinity(listener.native_id, {lg_cpu})
+        os.sched_setaffinity(0, {main_cpu})
+        
+        print(f"✓ Pinned toggler→CPU{tg_cpu}, listener→CPU{lg_cpu}, main→CPU{main_cpu}")
+        housekeeping = ",".join(str(c) for c in cpus[:-2])
+        print(f"  For full isolation boot with: isolcpus={tg_cpu},{lg_cpu} "
+              f"nohz_full={tg_cpu},{lg_cpu} irqaffinity={housekeeping}")
+        return True
+    except (OSError, AttributeError) as e:
+        print(f"⚠ Failed to set CPU affinity: {e}")
+    return False
+
+
+# ------------------------- timing -------------------------
+
+def _load_libc() -> Optional[Any]:
+    """Return the C library via ctypes on Linux, or None if unavailable."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        import ctypes
+        import ctypes.util
+
+        return ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+
+
+_libc = _load_libc()
+
+
+def _make_sleep_until():
+    """
+    Build sleep_until(deadline_ns), which sleeps until the monotonic clock reaches
+    deadline_ns (returns at once if it already has).
+
+    On Linux this is clock_nanosleep(CLOCK_MONOTONIC, TIMER_ABSTIME): the kernel
+    gets the absolute integer deadline, so no ns->float seconds conversion happens
+    and time spent before the call does not stretch the sleep. Otherwise falls back
+    to time.sleep on the remaining time.
+    """
+    clock_nanosleep = getattr(_libc, "clock_nanosleep", None)
+    if clock_nanosleep is not None:
+        import ctypes
+
+        class _Timespec(ctypes.Structure):
+            _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+        clock_nanosleep.argtypes = [ctypes.c_int, ctypes.c_int,
+                                    ctypes.POINTER(_Timespec), ctypes.POINTER(_Timespec)]
+        clock_nanosleep.restype = ctypes.c_int
+        clock_id = time.CLOCK_MONOTONIC
+        TIMER_ABSTIME = 1
+        EINTR = 4
+
+        def sleep_until(deadline_ns):
+            ts = _Timespec(*divmod(deadline_ns, 1_000_000_000))
+            # Absolute deadline: retrying after a signal cannot oversleep
+            while clock_nanosleep(clock_id, TIMER_ABSTIME, ctypes.byref(ts), None) == EINTR:
+                pass
+
+        return sleep_until
+
+    def sleep_until(deadline_ns):
+        remaining = deadline_ns - time.perf_counter_ns()
+        if remaining > 0:
+            time.sleep(remaining * 1e-9)
+
+    return sleep_until
+
+
+sleep_until = _make_sleep_until()
+
+
+def _make_busy_until():
+    """
+    Build busy_until(deadline_ns, abort), which spins until the monotonic clock
+    reaches deadline_ns or abort[0] (a one-element int64 array) becomes nonzero,
+    so a stop request also ends a spin that is already running.
+
+    With numba on Linux the spin is compiled with nogil=True and reads
+    CLOCK_MONOTONIC through clock_gettime directly, so an iteration costs a few ns
+    instead of a bytecode round trip and the listener thread keeps running
+    meanwhile. Otherwise falls back to a Python loop over perf_counter_ns, which
+    uses the same clock.
+    """
+    clock_gettime = getattr(_libc, "clock_gettime", None)
+    if njit is not None and clock_gettime is not None:
+        import ctypes
+
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.c_void_p]
+        clock_gettime.restype = ctypes.c_int
+        clock_id = time.CLOCK_MONOTONIC
+
+        # Not cache=True: numba cannot cache functions that call ctypes pointers
+        @njit(nogil=True)
+        def busy_until(deadline_ns, abort):
+            ts = np.empty(2, dtype=np.int64)  # struct timespec
+            while abort[0] == 0:
+                clock_gettime(clock_id, ts.ctypes.data)
+                if ts[0] * 1_000_000_000 + ts[1] >= deadline_ns:
+                    return
+
+        return busy_until
+
+    def busy_until(deadline_ns, abort):
+        _now = time.perf_counter_ns
+        while _now() < deadline_ns and not abort[0]:
+            pass
+
+    return busy_until
+
+
+busy_until = _make_busy_until()
+
+
 # ------------------------- backends -------------------------
 
 def setup_lines_gpiod(chipname: str, out_bcm: int, in_bcm: int) -> Tuple[Any, Any, Any]:
@@ -138,12 +273,21 @@ def setup_lines_pigpio(out_bcm: int, in_bcm: int) -> Tuple[Any, Any, Any]:
         pi.write(out_bcm, 0)
 
         class PigpioWrapper:
+            # Edges are handed to the consumer in batches: one queue put per
+            # BATCH_SIZE edges instead of one lock + condvar signal per edge.
+            # Partial batches are picked up by the consumer after FLUSH_S.
+            BATCH_SIZE = 32
+            FLUSH_S = 0.005
+
             def __init__(self, pi, pin, is_output=False):
                 self.pi = pi
                 self.pin = pin
                 self.is_output = is_output
                 self._last_tick = 0
-                self._event_queue = queue.Queue(maxsize=1000)
+                self._event_queue = queue.Queue(maxsize=1000)  # lists of (tick, user_ns)
+                self._batch = []
+                self._batch_lock = threading.Lock()
+                self._pending = collections.deque()
                 
                 if not is_output:
                     # Set up edge detection
@@ -151,21 +295,40 @@ def setup_lines_pigpio(out_bcm: int, in_bcm: int) -> Tuple[Any, Any, Any]:
 
             def _edge_callback(self, gpio, level, tick):
                 """Called by pigpio on rising edge. tick is DMA timestamp."""
+                user_ns = now_ns()
+                with self._batch_lock:
+                    self._batch.append((tick, user_ns))
+                    if len(self._batch) < self.BATCH_SIZE:
+                        return
+                    batch, self._batch = self._batch, []
                 try:
-                    self._event_queue.put_nowait((tick, now_ns()))
+                    self._event_queue.put_nowait(batch)
                 except queue.Full:
                     pass
 
+            def _take_partial_batch(self):
+                with self._batch_lock:
+                    batch, self._batch = self._batch, []
+                self._pending.extend(batch)
+
             def set_value(self, value):
                 if self.is_output:
                     self.pi.write(self.pin, value)
 
             def event_wait(self, timeout):
-                try:
-                    self._last_tick, self._last_user_ns = self._event_queue.get(timeout=timeout)
-                    return True
-                except queue.Empty:
-                    return False
+                deadline = time.monotonic() + timeout
+                while not self._pending:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        self._pending.extend(
+                            self._event_queue.get(timeout=max(0.0, min(remaining, self.FLUSH_S)))
+                        )
+                    except queue.Empty:
+                        self._take_partial_batch()
+                        if not self._pending and remaining <= 0:
+                            return False
+                self._last_tick, self._last_user_ns = self._pending.popleft()
+                return True
 
             def event_read(self):
                 # Return a simple object with tick for DMA timestamp
@@ -186,39 +349,127 @@ def setup_lines_pigpio(out_bcm: int, in_bcm: int) -> Tuple[Any, Any, Any]:
         raise
 
 
+# ------------------------- pairing -------------------------
+
+if njit is not None:
+
+    @njit(cache=True, nogil=True)
+    def _pair_and_diff_jit(send_arr, edge_arr, out):
+        for i in range(send_arr.size):
+            if send_arr[i] >= 0 and edge_arr[i] >= 0:
+                out[i] = edge_arr[i] - send_arr[i]
+            else:
+                out[i] = -1
+
+
+def pair_and_diff(send_arr: np.ndarray, edge_arr: np.ndarray,
+                  out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Walk the send/edge timestamp arrays in lock-step and return
+    dt = edge - send where both are populated, -1 (miss) otherwise.
+
+    Compiled with numba when available (one pass, no temporaries); otherwise a
+    masked np.subtract into the output.
+    """
+    if out is None:
+        out = np.empty(send_arr.size, dtype=np.int64)
+    if njit is not None:
+        _pair_and_diff_jit(send_arr, edge_arr, out)
+    else:
+        out.fill(-1)
+        np.subtract(edge_arr, send_arr, out=out, where=(send_arr >= 0) & (edge_arr >= 0))
+    return out
+
+
 # ------------------------- statistics -------------------------
 
-def compute_percentiles(dts_ns: List[int]) -> Tuple[float, float, float, int]:
+_QUANTILES = (0.5, 0.95, 0.99)
+
+# Above this many samples compute_full_stats switches to bucket_percentiles
+_BUCKET_MIN_SAMPLES = 100_000
+
+if njit is not None:
+
+    @njit(parallel=True, cache=True)
+    def _bucket_counts_jit(arr_ns, bin_ns, nbins, nchunks):
+        # Per-thread local tables, reduced at the end: no shared-counter contention
+        chunk = (arr_ns.size + nchunks - 1) // nchunks
+        local = np.zeros((nchunks, nbins), dtype=np.int64)
+        for t in prange(nchunks):
+            for i in range(t * chunk, min(arr_ns.size, (t + 1) * chunk)):
+                local[t, arr_ns[i] // bin_ns] += 1
+        return local.sum(axis=0)
+
+
+def bucket_percentiles(
+    arr_ns: np.ndarray, qs: Sequence[float], bin_ns: int = 100, max_ns: int = 10_000_000
+) -> np.ndarray:
+    """
+    Quantiles of a non-negative int64 latency array from a single-pass histogram.
+
+    Builds a count per bin_ns-wide bin up to max_ns, then walks the CDF to the bin
+    holding each requested rank and reports that bin's midpoint clamped to the
+    data's [min, max], so results are within bin_ns/2 of the exact order statistic
+    and never outside the observed range. O(n) instead of a partition per
+    call; uses per-thread tables under numba, np.bincount otherwise. Falls back to
+    np.quantile when any value is at or above max_ns.
+    """
+    arr_ns = np.asarray(arr_ns, dtype=np.int64)
+    if arr_ns.size == 0:
+        return np.zeros(len(qs))
+    mx = arr_ns.max()
+    if mx >= max_ns:
+        return np.quantile(arr_ns, qs)
+
+    nbins = -(-max_ns // bin_ns)
+    if njit is not None:
+        counts = _bucket_counts_jit(arr_ns, bin_ns, nbins, get_num_threads())
+    else:
+        counts = np.bincount(arr_ns // bin_ns, minlength=nbins)
+
+    # Rank r (0-based, floor of the linear position) lives in the first bin whose
+    # cumulative count exceeds r
+    ranks = np.floor(np.asarray(qs, dtype=np.float64) * (arr_ns.size - 1))
+    bins = np.searchsorted(np.cumsum(counts), ranks, side="right")
+    return np.clip(bins * bin_ns + bin_ns / 2, arr_ns.min(), mx)
+
+
+def _valid_latencies(dts_ns: Union[np.ndarray, Sequence[Optional[float]]]) -> np.ndarray:
+    """Return the valid (not None, finite, non-negative) latencies as an int64 array."""
+    arr = np.asarray(dts_ns)
+    if arr.dtype == object:
+        # Mixed None/NaN/int input: drop None here, NaN goes with the float mask
+        arr = np.array([dt for dt in dts_ns if dt is not None], dtype=np.float64)
+    if arr.dtype.kind == "f":
+        arr = arr[np.isfinite(arr)]
+    return arr[arr >= 0].astype(np.int64, copy=False)
+
+
+def compute_percentiles(
+    dts_ns: Union[np.ndarray, Sequence[Optional[float]]]
+) -> Tuple[float, float, float, int]:
     """Compute percentiles with robust handling of edge cases."""
-    if not dts_ns:
+    arr = _valid_latencies(dts_ns)
+    if arr.size == 0:
         return 0.0, 0.0, 0.0, 0
     
-    # Filter out invalid values
-    valid_dts = [dt for dt in dts_ns if dt is not None and not np.isnan(dt) and dt >= 0]
-    if not valid_dts:
-        return 0.0, 0.0, 0.0, 0
-    
-    arr = np.array(valid_dts, dtype=np.int64)
-    
     if len(arr) == 1:
         val = float(arr[0])
         return val, val, val, int(arr[0])
     
-    p50 = float(np.percentile(arr, 50))
-    p95 = float(np.percentile(arr, 95))
-    p99 = float(np.percentile(arr, 99))
+    p50, p95, p99 = np.quantile(arr, _QUANTILES).tolist()
     mx = int(arr.max())
     return p50, p95, p99, mx
 
 
-def compute_full_stats(dts_ns: List[int]) -> LatencyResult:
+def compute_full_stats(dts_ns: Union[np.ndarray, Sequence[Optional[float]]]) -> LatencyResult:
     """Compute comprehensive statistics for latency measurements."""
     total = len(dts_ns)
-    valid_dts = [dt for dt in dts_ns if dt is not None and not np.isnan(dt) and dt >= 0]
-    successful = len(valid_dts)
+    arr = _valid_latencies(dts_ns)
+    successful = int(arr.size)
     missed = total - successful
     
-    if not valid_dts:
+    if successful == 0:
         return LatencyResult(
             total_samples=total,
             successful_samples=0,
@@ -227,15 +478,20 @@ def compute_full_stats(dts_ns: List[int]) -> LatencyResult:
             max_ns=0, min_ns=0, mean_ns=0.0, std_ns=0.0
         )
     
-    arr = np.array(valid_dts, dtype=np.int64)
+    # One partition pass for all three quantiles instead of one per np.percentile call;
+    # for very long runs a single O(n) histogram pass instead
+    if successful > _BUCKET_MIN_SAMPLES:
+        p50, p95, p99 = bucket_percentiles(arr, _QUANTILES).tolist()
+    else:
+        p50, p95, p99 = np.quantile(arr, _QUANTILES).tolist()
     
     return LatencyResult(
         total_samples=total,
         successful_samples=successful,
         missed_samples=missed,
-        p50_ns=float(np.percentile(arr, 50)),
-        p95_ns=float(np.percentile(arr, 95)),
-        p99_ns=float(np.percentile(arr, 99)),
+        p50_ns=p50,
+        p95_ns=p95,
+        p99_ns=p99,
         max_ns=int(arr.max()),
         min_ns=int(arr.min()),
         mean_ns=float(arr.mean()),
@@ -244,6 +500,30 @@ def compute_full_stats(dts_ns: List[int]) -> LatencyResult:
 
 
 
+# ------------------------- output -------------------------
+
+_CSV_HEADER = b"ts_send_ns,ts_edge_ns,dt_ns\n"
+_CSV_CHUNK_ROWS = 1 << 15  # ~1 MiB of text per write()
+
+
+def write_samples_csv(path: str, ts_send: np.ndarray, ts_edge: np.ndarray,
+                      dts: np.ndarray) -> None:
+    """
+    Write samples as ts_send_ns,ts_edge_ns,dt_ns rows; misses (dt < 0) get empty
+    edge/dt fields. Rows are formatted a chunk at a time and issued as one write()
+    per chunk rather than one csv.writer call per row. The file is opened in binary
+    mode with a 1 MiB block buffer and is never flushed before close.
+    """
+    with open(path, "wb", buffering=1 << 20) as f:
+        f.write(_CSV_HEADER)
+        for start in range(0, len(ts_send), _CSV_CHUNK_ROWS):
+            stop = start + _CSV_CHUNK_ROWS
+            rows = zip(ts_send[start:stop].tolist(), ts_edge[start:stop].tolist(),
+                       dts[start:stop].tolist())
+            f.write("".join([f"{s},{e},{dt}\n" if dt >= 0 else f"{s},,\n"
+                             for s, e, dt in rows]).encode("ascii"))
+
+
 # ------------------------- main measurement loop -------------------------
 
 def main():
@@ -258,6 +538,8 @@ def main():
     ap.add_argument("--pulse-us", type=int, default=1000, help="HIGH pulse width (microseconds)")
     ap.add_argument("--csv", default=None, help="optional CSV output path")
     ap.add_argument("--rt", action="store_true", help="attempt real-time scheduling (SCHED_FIFO)")
+    ap.add_argument("--affinity", action="store_true",
+                   help="pin toggler/listener to the last two CPUs and main to the first")
     ap.add_argument("--busy-wait-us", type=int, default=50, 
                    help="busy-wait threshold in microseconds (lower = more precise, higher CPU)")
 
@@ -299,48 +581,83 @@ def main():
     pulse_ns = int(max(1, args.pulse_us) * 1000)
     busy_wait_ns = args.busy_wait_us * 1000
     
+    # Stop flag the (possibly compiled, GIL-free) spin polls alongside `stop`
+    stop_flag = np.zeros(1, dtype=np.int64)
+    busy_until(0, stop_flag)  # compile the JIT spin (if any) before the run deadline is set
+    
     # Duration (0 = indefinite)
     run_indefinitely = args.seconds == 0
     t_end = time.time() + args.seconds if not run_indefinitely else float('inf')
 
-    # Thread-safe queues with sequence numbers for better pairing
-    sends_q: "queue.Queue[Tuple[int, int]]" = queue.Queue(maxsize=100000)  # (seq, ts_send)
-    edges_q: "queue.Queue[Tuple[int, int]]" = queue.Queue(maxsize=100000)  # (seq, ts_edge)
+    # Pairing state: SoA ring indexed by seq % ring_size, written directly by the
+    # measurement threads. The toggler owns ring_seq/ring_send and resets ring_edge
+    # when it claims a slot; the listener only writes ring_edge for the slot's
+    # current owner, so no lock or hand-off queue is needed.
+    ring_size = max(1024, int(args.hz * (args.seconds or 60) * 2))
+    ring_seq = np.full(ring_size, -1, dtype=np.int64)
+    ring_send = np.full(ring_size, -1, dtype=np.int64)
+    ring_edge = np.full(ring_size, -1, dtype=np.int64)
     stop = threading.Event()
 
-    # Sequence counter for pairing
-    seq_counter = [0]  # mutable container for thread sharing
+    def request_stop():
+        stop_flag[0] = 1
+        stop.set()
+
+    # Long runs outlive the ring: the main thread copies settled laps out before
+    # the toggler comes back around to them (flushed seqs are [0, flushed)).
+    laps_send, laps_edge = [], []
+    flushed = 0
+    lost = 0
+    flush_interval_s = ring_size / args.hz / 4
+
+    def drain(upto: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Copy seqs [flushed, upto) out of the ring; slots already reused count as lost."""
+        nonlocal flushed, lost
+        seqs = np.arange(flushed, upto, dtype=np.int64)
+        idx = seqs % ring_size
+        owned = ring_seq[idx] == seqs
+        lost += int(seqs.size - np.count_nonzero(owned))
+        flushed = upto
+        return ring_send[idx][owned], ring_edge[idx][owned]
+
+    def record_edge(seq: int, ts_edge: int):
+        slot = seq % ring_size
+        if ring_seq[slot] == seq:
+            ring_edge[slot] = ts_edge
 
     def toggler():
         """Thread that generates pulses at specified frequency."""
-        next_ts = now_ns()
+        # Local bindings: hot-loop calls skip the global/attribute lookups
+        _now = time.perf_counter_ns
+        _sleep_until = sleep_until
+        _time = time.time
+        _stop_is_set = stop.is_set
+        _busy_until = busy_until
+        
+        next_ts = _now()
+        seq = 0
         last_val = 0
         
-        while not stop.is_set() and (run_indefinitely or time.time() < t_end):
+        while not _stop_is_set() and (run_indefinitely or _time() < t_end):
             next_ts += period_ns
             
             # Sleep most of the way, then busy-wait for precision
-            sleep_until = next_ts - busy_wait_ns
-            current = now_ns()
-            if current < sleep_until:
-                time.sleep((sleep_until - current) / 1e9)
+            _sleep_until(next_ts - busy_wait_ns)
             
             # Busy-wait for final precision
-            while now_ns() < next_ts and not stop.is_set():
-                pass
+            _busy_until(next_ts, stop_flag)
             
-            if stop.is_set():
+            if _stop_is_set():
                 break
                 
-            ts_send = now_ns()
-            seq = seq_counter[0]
-            seq_counter[0] += 1
+            ts_send = _now()
             
-            try:
-                sends_q.put_nowait((seq, ts_send))
-            except queue.Full:
-                print("⚠ Send queue full, dropping sample", file=sys.stderr)
-                continue
+            # Claim the slot before the edge can possibly arrive
+            slot = seq % ring_size
+            ring_edge[slot] = -1
+            ring_send[slot] = ts_send
+            ring_seq[slot] = seq
+            seq += 1
 
             # Generate rising edge
             try:
@@ -352,13 +669,9 @@ def main():
             
             # Keep high for pulse duration
             pulse_end = ts_send + pulse_ns
-            sleep_until = pulse_end - busy_wait_ns
-            current = now_ns()
-            if current < sleep_until:
-                time.sleep((sleep_until - current) / 1e9)
+            _sleep_until(pulse_end - busy_wait_ns)
             
-            while now_ns() < pulse_end and not stop.is_set():
-                pass
+            _busy_until(pulse_end, stop_flag)
             
             # Return to low
             try:
@@ -369,118 +682,111 @@ def main():
 
     def listener():
         """Thread that waits for rising edges."""
+        _now = time.perf_counter_ns
+        _time = time.time
+        _stop_is_set = stop.is_set
         current_seq = 0
         
-        while not stop.is_set() and (run_indefinitely or time.time() < t_end):
+        while not _stop_is_set() and (run_indefinitely or _time() < t_end):
             try:
                 if inl.event_wait(1.0):  # 1s timeout
                     event = inl.event_read()
-                    ts_edge = now_ns()
+                    # Backends that timestamp the edge themselves (pigpio callback)
+                    # report it, so batched delivery does not skew the latency
+                    ts_edge = getattr(event, "user_ns", None) or _now()
                     
-                    try:
-                        edges_q.put_nowait((current_seq, ts_edge))
-                        current_seq += 1
-                    except queue.Full:
-                        print("⚠ Edge queue full, dropping sample", file=sys.stderr)
+                    record_edge(current_seq, ts_edge)
+                    current_seq += 1
             except Exception as e:
-                if not stop.is_set():
+                if not _stop_is_set():
                     print(f"⚠ Input error: {e}", file=sys.stderr)
 
+    def listener_epoll():
+        """
+        Listener for lines exposing an event fd (libgpiod): sleep in epoll and
+        drain every pending event per wakeup with event_read_multiple().
+        """
+        _now = time.perf_counter_ns
+        _time = time.time
+        _stop_is_set = stop.is_set
+        current_seq = 0
+        ep = select.epoll()
+        ep.register(inl.event_get_fd(), select.EPOLLIN)
+        
+        try:
+            while not _stop_is_set() and (run_indefinitely or _time() < t_end):
+                try:
+                    if not ep.poll(1.0):  # 1s timeout
+                        continue
+                    events = inl.event_read_multiple()
+                    # Events drained in one wakeup were observed together
+                    ts_edge = _now()
+                    
+                    for _ in events:
+                        record_edge(current_seq, ts_edge)
+                        current_seq += 1
+                except Exception as e:
+                    if not _stop_is_set():
+                        print(f"⚠ Input error: {e}", file=sys.stderr)
+        finally:
+            ep.close()
+
     # Start threads
+    use_epoll = hasattr(select, "epoll") and hasattr(inl, "event_get_fd")
     tg = threading.Thread(target=toggler, name="toggler", daemon=True)
-    lg = threading.Thread(target=listener, name="listener", daemon=True)
+    lg = threading.Thread(target=listener_epoll if use_epoll else listener,
+                          name="listener", daemon=True)
     
     print(f"🚀 Starting measurement: {args.hz}Hz, {args.seconds}s{'(indefinite)' if run_indefinitely else ''}")
     print("Press Ctrl+C to stop...")
     
     tg.start()
     lg.start()
-
-    # Sample collection with improved pairing
-    samples = []  # (ts_send, ts_edge, dt_ns) or (ts_send, None, None) for misses
-    send_buffer = {}  # seq -> ts_send for pending sends
-    edge_buffer = {}  # seq -> ts_edge for unmatched edges
     
+    if args.affinity:
+        pin_measurement_threads(tg, lg)
+
     def handle_signal(*_):
         print("\n🛑 Stopping measurement...")
-        stop.set()
+        request_stop()
     
     for s in (signal.SIGINT, signal.SIGTERM):
         signal.signal(s, handle_signal)
 
+    # The threads record straight into the ring; wake periodically to flush
+    # laps older than half a ring, whose edges have long since arrived or missed
     try:
-        while not stop.is_set() and (run_indefinitely or time.time() < t_end):
-            # Process sends
-            try:
-                seq, ts_send = sends_q.get(timeout=0.1)
-                send_buffer[seq] = ts_send
-                
-                # Check if we have a matching edge
-                if seq in edge_buffer:
-                    ts_edge = edge_buffer.pop(seq)
-                    dt = ts_edge - ts_send
-                    samples.append((ts_send, ts_edge, dt))
-                    
-            except queue.Empty:
-                pass
-            
-            # Process edges
-            try:
-                seq, ts_edge = edges_q.get_nowait()
-                
-                if seq in send_buffer:
-                    ts_send = send_buffer.pop(seq)
-                    dt = ts_edge - ts_send
-                    samples.append((ts_send, ts_edge, dt))
-                else:
-                    edge_buffer[seq] = ts_edge
-                    
-            except queue.Empty:
-                pass
-            
-            # Clean up old unmatched items (prevent memory leak)
-            if len(samples) % 1000 == 0:
-                current_seq = seq_counter[0]
-                old_threshold = current_seq - 10000
-                send_buffer = {k: v for k, v in send_buffer.items() if k > old_threshold}
-                edge_buffer = {k: v for k, v in edge_buffer.items() if k > old_threshold}
-                
+        while not stop.wait(min(flush_interval_s, max(0.0, t_end - time.time()))):
+            if not run_indefinitely and time.time() >= t_end:
+                break
+            head = int(ring_seq.max()) + 1
+            if head - ring_size // 2 > flushed:
+                send, edge = drain(head - ring_size // 2)
+                laps_send.append(send)
+                laps_edge.append(edge)
     except KeyboardInterrupt:
         handle_signal()
 
     # Final cleanup and processing
-    stop.set()
+    request_stop()
     tg.join(timeout=2.0)
     lg.join(timeout=2.0)
     
-    # Process any remaining pairs
-    final_timeout = time.time() + 1.0
-    while time.time() < final_timeout:
-        processed_any = False
-        
-        try:
-            seq, ts_send = sends_q.get_nowait()
-            send_buffer[seq] = ts_send
-            processed_any = True
-        except queue.Empty:
-            pass
-        
-        try:
-            seq, ts_edge = edges_q.get_nowait()
-            if seq in send_buffer:
-                ts_send = send_buffer.pop(seq)
-                dt = ts_edge - ts_send
-                samples.append((ts_send, ts_edge, dt))
-            processed_any = True
-        except queue.Empty:
-            pass
-            
-        if not processed_any:
-            break
-    
-    # Add missed samples
-    for seq, ts_send in send_buffer.items():
-        samples.append((ts_send, None, None))
+    # Every claimed slot is a sample; a missing edge is a miss (dt = -1). Until the
+    # ring wraps, slot == seq, so the first n_sent slots are already in pulse order
+    # and are used as views; otherwise the flushed laps plus the ring's tail.
+    n_sent = int(ring_seq.max()) + 1
+    if not laps_send and n_sent <= ring_size:
+        ts_send = ring_send[:n_sent]
+        ts_edge = ring_edge[:n_sent]
+    else:
+        send, edge = drain(n_sent)
+        ts_send = np.concatenate(laps_send + [send])
+        ts_edge = np.concatenate(laps_edge + [edge])
+    if lost:
+        print(f"⚠ {lost} pulses were overwritten in the ring before they could be "
+              f"flushed and are not included", file=sys.stderr)
+    dts = pair_and_diff(ts_send, ts_edge)
 
     # Cleanup backend
     try:
@@ -490,11 +796,10 @@ def main():
         pass
 
     # Analysis
-    if not samples:
+    if ts_send.size == 0:
         print("⚠ No samples collected. Check wiring/backend setup.", file=sys.stderr)
         sys.exit(2)
 
-    dts = [dt for (_, _, dt) in samples if dt is not None]
     stats = compute_full_stats(dts)
     
     # Results summary
@@ -512,11 +817,7 @@ def main():
     if args.csv:
         try:
             os.makedirs(os.path.dirname(os.path.abspath(args.csv)), exist_ok=True)
-            with open(args.csv, "w", newline="") as f:
-                w = csv.writer(f)
-                w.writerow(["ts_send_ns", "ts_edge_ns", "dt_ns"])
-                for s, e, dt in samples:
-                    w.writerow([s, e if e is not None else "", dt if dt is not None else ""])
+            write_samples_csv(args.csv, ts_send, ts_edge, dts)
             print(f"💾 CSV written: {args.csv}")
         except Exception as e:
             print(f"⚠ CSV write failed: {e}", file=sys.stderr)
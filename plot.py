@@ -7,29 +7,44 @@ import argparse
 import csv
 import os
 import sys
-from typing import List, Optional
+from typing import List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import matplotlib.pyplot as plt
 
+try:
+    import pandas as pd
+except ImportError:  # optional: faster CSV parsing
+    pd = None
 
-def load_latency_data(csv_path: str) -> List[float]:
-    """Load latency data from CSV file."""
-    dts_us = []
+
+def _read_columns(csv_path: str, names: Sequence[str]) -> List[np.ndarray]:
+    """Read the named columns as float64 arrays; empty or invalid fields become NaN."""
+    if pd is not None:
+        df = pd.read_csv(csv_path, usecols=list(names))
+        return [pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64,
+                                                                  na_value=np.nan)
+                for name in names]
+    
+    with open(csv_path, newline="") as f:
+        header = [name.strip() for name in next(csv.reader(f), [])]
+    cols = [header.index(name) for name in names]
+    data = np.genfromtxt(csv_path, delimiter=",", skip_header=1, usecols=cols,
+                         dtype=np.float64).reshape(-1, len(cols))
+    return [data[:, i] for i in range(len(cols))]
+
+
+def load_latency_columns(csv_path: str, timestamps: bool = True
+                         ) -> Tuple[Optional[np.ndarray], np.ndarray]:
+    """
+    Load latency data from CSV file in a single pass.
     
+    Returns (ts_send_ns, dts_us): send timestamps as int64 (None when timestamps is
+    False) and latencies as a float32 array of µs, for the successful samples only.
+    """
+    names = ["ts_send_ns", "dt_ns"] if timestamps else ["dt_ns"]
     try:
-        with open(csv_path, newline="") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                dt_str = row.get("dt_ns", "").strip()
-                if dt_str and dt_str != "":
-                    try:
-                        dt_ns = int(dt_str)
-                        if dt_ns > 0:  # Only positive latencies
-                            dts_us.append(dt_ns / 1000.0)  # Convert to µs
-                    except ValueError:
-                        continue  # Skip invalid entries
-                        
+        columns = _read_columns(csv_path, names)
     except FileNotFoundError:
         print(f"ERROR: File not found: {csv_path}", file=sys.stderr)
         sys.exit(1)
@@ -37,19 +52,51 @@ def load_latency_data(csv_path: str) -> List[float]:
         print(f"ERROR: Failed to read CSV: {e}", file=sys.stderr)
         sys.exit(1)
     
-    return dts_us
+    # Only positive latencies; misses and invalid entries are NaN and drop out here
+    dt_ns = columns[-1]
+    valid = np.isfinite(dt_ns) & (dt_ns > 0)
+    ts_send_ns = None
+    if timestamps:
+        valid &= np.isfinite(columns[0])
+        ts_send_ns = columns[0][valid].astype(np.int64)
+    return ts_send_ns, (dt_ns[valid] / 1000.0).astype(np.float32)  # Convert to µs
 
 
-def plot_latency_histogram(dts_us: List[float], bins: int = 50, log_scale: bool = False, 
-                          output_path: Optional[str] = None, title: str = "GPIO Loopback Latency"):
+def load_latency_data(csv_path: str) -> np.ndarray:
+    """Load latency data from CSV file as a float32 array of µs."""
+    return load_latency_columns(csv_path, timestamps=False)[1]
+
+
+def equal_width_histogram(arr: np.ndarray, bins: int):
+    """
+    Equal-width histogram over [min, max] in a single np.bincount pass.
+    Returns (counts, edges) with the same binning as np.histogram(arr, bins).
+    """
+    arr = np.asarray(arr, dtype=np.float64)
+    lo, hi = float(arr.min()), float(arr.max())
+    if hi <= lo:
+        lo, hi = lo - 0.5, hi + 0.5  # np.histogram's range for constant input
+    edges = np.linspace(lo, hi, bins + 1)
+    
+    # Same index computation and edge correction as np.histogram's uniform-bin path
+    idx = ((arr - lo) * (bins / (hi - lo))).astype(np.int64)
+    idx[idx == bins] -= 1  # the max value belongs to the last bin
+    idx[arr < edges[idx]] -= 1
+    idx[(arr >= edges[idx + 1]) & (idx != bins - 1)] += 1
+    counts = np.bincount(idx, minlength=bins)
+    return counts, edges
+
+
+def plot_latency_histogram(dts_us: Union[np.ndarray, Sequence[float]], bins: int = 50,
+                          log_scale: bool = False, output_path: Optional[str] = None,
+                          title: str = "GPIO Loopback Latency"):
     """Create and display/save latency histogram with percentile markers."""
     
-    if not dts_us:
+    arr = np.asarray(dts_us)
+    if arr.size == 0:
         print("No valid latency data to plot.", file=sys.stderr)
         return
     
-    arr = np.array(dts_us)
-    
     # Calculate statistics
     stats = {
         'mean': np.mean(arr),
@@ -75,9 +122,10 @@ def plot_latency_histogram(dts_us: List[float], bins: int = 50, log_scale: bool
     # Create figure
     plt.figure(figsize=(12, 8))
     
-    # Main histogram
-    counts, bin_edges, patches = plt.hist(arr, bins=bins, alpha=0.7, color='skyblue', 
-                                         edgecolor='black', linewidth=0.5)
+    # Main histogram: bin ourselves, then draw the bars directly
+    counts, bin_edges = equal_width_histogram(arr, bins)
+    plt.bar(bin_edges[:-1], counts, width=np.diff(bin_edges), align='edge', alpha=0.7,
+            color='skyblue', edgecolor='black', linewidth=0.5)
     
     # Add percentile lines
     percentiles = [
@@ -123,40 +171,18 @@ def plot_latency_histogram(dts_us: List[float], bins: int = 50, log_scale: bool
     plt.close()
 
 
-def plot_time_series(csv_path: str, output_path: Optional[str] = None):
+def plot_time_series(ts_send_ns: np.ndarray, latencies_us: np.ndarray,
+                     output_path: Optional[str] = None):
     """Plot latency over time to show temporal patterns."""
     
-    timestamps = []
-    latencies_us = []
-    
-    try:
-        with open(csv_path, newline="") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                ts_str = row.get("ts_send_ns", "").strip()
-                dt_str = row.get("dt_ns", "").strip()
-                
-                if ts_str and dt_str and dt_str != "":
-                    try:
-                        ts_ns = int(ts_str)
-                        dt_ns = int(dt_str)
-                        if dt_ns > 0:
-                            timestamps.append(ts_ns)
-                            latencies_us.append(dt_ns / 1000.0)
-                    except ValueError:
-                        continue
-                        
-    except Exception as e:
-        print(f"⚠ Failed to load time series data: {e}", file=sys.stderr)
-        return
-    
-    if not timestamps:
+    if len(ts_send_ns) == 0:
         print("No valid time series data found.", file=sys.stderr)
         return
     
     # Convert to relative time in seconds
-    start_time = timestamps[0]
-    rel_times = [(ts - start_time) / 1e9 for ts in timestamps]
+    ts_send_ns = np.asarray(ts_send_ns, dtype=np.int64)
+    latencies_us = np.asarray(latencies_us)
+    rel_times = (ts_send_ns - ts_send_ns[0]) / 1e9
     
     # Create plot
     plt.figure(figsize=(14, 6))
@@ -165,13 +191,12 @@ def plot_time_series(csv_path: str, output_path: Optional[str] = None):
     # Add running percentiles
     if len(latencies_us) > 100:
         window_size = len(latencies_us) // 50  # 50 points
-        running_p95 = []
-        running_times = []
         
-        for i in range(window_size, len(latencies_us), window_size):
-            window = latencies_us[i-window_size:i]
-            running_p95.append(np.percentile(window, 95))
-            running_times.append(rel_times[i])
+        # One (n_windows, window_size) view, one percentile call across all windows
+        n_full = (len(latencies_us) // window_size) * window_size
+        windows = latencies_us[:n_full].reshape(-1, window_size)
+        running_p95 = np.percentile(windows, 95, axis=1)
+        running_times = rel_times[window_size - 1:n_full:window_size]
         
         plt.plot(running_times, running_p95, 'r-', linewidth=2, alpha=0.8, label='Running P95')
         plt.legend()
@@ -212,10 +237,10 @@ def main():
         print(f"ERROR: CSV file not found: {args.csv}", file=sys.stderr)
         sys.exit(1)
     
-    # Load data
-    dts_us = load_latency_data(args.csv)
+    # Load data: one pass shared by the histogram and the time series
+    ts_send_ns, dts_us = load_latency_columns(args.csv, timestamps=args.time_series)
     
-    if not dts_us:
+    if dts_us.size == 0:
         print("ERROR: No valid latency data found in CSV", file=sys.stderr)
         sys.exit(1)
     
@@ -230,7 +255,7 @@ def main():
     
     # Optional time series plot
     if args.time_series:
-        plot_time_series(args.csv, args.output)
+        plot_time_series(ts_send_ns, dts_us, args.output)
 
 
 if __name__ == "__main__":
@@ -14,8 +14,15 @@ from unittest.mock import patch, MagicMock
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from latency_meter import compute_percentiles, compute_full_stats
-from sim_backend import setup_sim_lines, get_distribution_info, _LatencyModel
+from latency_meter import (
+    bucket_percentiles,
+    compute_full_stats,
+    compute_percentiles,
+    pair_and_diff,
+    write_samples_csv,
+)
+from sim_backend import setup_sim_lines, get_distribution_info, _EdgeScheduler, _LatencyModel
+from plot import equal_width_histogram, load_latency_columns
 
 
 class TestPercentiles(unittest.TestCase):
@@ -104,6 +111,152 @@ class TestFullStats(unittest.TestCase):
         self.assertEqual(stats.successful_samples, 0)
         self.assertEqual(stats.missed_samples, 3)
         self.assertEqual(stats.mean_ns, 0.0)
+    
+    def test_full_stats_ndarray_miss_sentinel(self):
+        """Test int64 arrays where misses are encoded as -1."""
+        dts = np.array([10, -1, 20, 30, -1, 40], dtype=np.int64)
+        stats = compute_full_stats(dts)
+        
+        self.assertEqual(stats.total_samples, 6)
+        self.assertEqual(stats.successful_samples, 4)
+        self.assertEqual(stats.missed_samples, 2)
+        self.assertEqual(stats.min_ns, 10)
+        self.assertEqual(stats.max_ns, 40)
+
+
+class TestBucketPercentiles(unittest.TestCase):
+    """Test the histogram-based percentile path used for long runs."""
+    
+    def test_matches_exact_within_bin(self):
+        """Bucketed quantiles land within one bin of np.quantile."""
+        rng = np.random.default_rng(42)
+        arr = rng.lognormal(np.log(400000), 0.3, 50000).astype(np.int64)
+        qs = [0.5, 0.95, 0.99]
+        
+        approx = bucket_percentiles(arr, qs, bin_ns=100)
+        exact = np.quantile(arr, qs)
+        np.testing.assert_allclose(approx, exact, atol=100)
+    
+    def test_out_of_range_falls_back(self):
+        """Values beyond max_ns use the exact quantile path."""
+        arr = np.array([100, 200, 300, 50000000], dtype=np.int64)
+        
+        result = bucket_percentiles(arr, [0.5], max_ns=10000000)
+        self.assertEqual(result[0], np.quantile(arr, 0.5))
+    
+    def test_constant_input_stays_in_range(self):
+        """Identical samples report the exact value, never above the max."""
+        arr = np.full(200000, 400000, dtype=np.int64)
+        
+        result = bucket_percentiles(arr, [0.5, 0.99])
+        np.testing.assert_array_equal(result, np.quantile(arr, [0.5, 0.99]))
+        
+        stats = compute_full_stats(arr)
+        self.assertLessEqual(stats.p50_ns, stats.max_ns)
+        self.assertLessEqual(stats.p99_ns, stats.max_ns)
+        self.assertEqual(stats.p50_ns, np.quantile(arr, 0.5))
+    
+    def test_full_stats_large_input(self):
+        """compute_full_stats stays consistent when it switches to buckets."""
+        arr = np.random.default_rng(7).integers(100000, 900000, 200000)
+        stats = compute_full_stats(arr)
+        
+        self.assertEqual(stats.successful_samples, 200000)
+        self.assertAlmostEqual(stats.p50_ns, np.quantile(arr, 0.5), delta=100)
+        self.assertLessEqual(stats.p95_ns, stats.p99_ns)
+
+
+class TestHistogram(unittest.TestCase):
+    """Test the plot histogram fast path."""
+    
+    def test_matches_np_histogram(self):
+        """Counts and edges agree with np.histogram for equal-width bins."""
+        arr = np.random.default_rng(3).lognormal(6.0, 0.4, 10000).astype(np.float32)
+        
+        counts, edges = equal_width_histogram(arr, 50)
+        ref_counts, ref_edges = np.histogram(arr.astype(np.float64), bins=50)
+        np.testing.assert_array_equal(counts, ref_counts)
+        np.testing.assert_allclose(edges, ref_edges)
+    
+    def test_edge_aligned_input(self):
+        """Values sitting exactly on bin edges are binned like np.histogram."""
+        for lo, hi, bins in [(0.0, 1.0, 10), (0.1, 0.7, 3), (-2.5, 17.3, 49)]:
+            with self.subTest(lo=lo, hi=hi, bins=bins):
+                arr = np.repeat(np.linspace(lo, hi, bins + 1), 3)
+                
+                counts, edges = equal_width_histogram(arr, bins)
+                ref_counts, ref_edges = np.histogram(arr, bins=bins)
+                np.testing.assert_array_equal(counts, ref_counts)
+                np.testing.assert_array_equal(edges, ref_edges)
+    
+    def test_constant_input(self):
+        """Constant input lands in a single bin like np.histogram."""
+        counts, edges = equal_width_histogram(np.full(10, 42.0), 5)
+        ref_counts, ref_edges = np.histogram(np.full(10, 42.0), bins=5)
+        np.testing.assert_array_equal(counts, ref_counts)
+        np.testing.assert_allclose(edges, ref_edges)
+
+
+class TestPlotLoading(unittest.TestCase):
+    """Test CSV loading for the plots on both parsing backends."""
+    
+    CSV = ("ts_send_ns,ts_edge_ns,dt_ns\n"
+           "1000,1500,500\n"
+           "2000,,\n"
+           "3000,3000,0\n"
+           "4000,5000,1000\n")
+    
+    def _check_backend(self):
+        """Misses and non-positive latencies drop out, with or without timestamps."""
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, "samples.csv")
+            with open(csv_path, "w") as f:
+                f.write(self.CSV)
+            
+            ts_send, dts_us = load_latency_columns(csv_path)
+            self.assertEqual(ts_send.dtype, np.int64)
+            np.testing.assert_array_equal(ts_send, [1000, 4000])
+            self.assertEqual(dts_us.dtype, np.float32)
+            np.testing.assert_allclose(dts_us, [0.5, 1.0])
+            
+            ts_send, dts_us = load_latency_columns(csv_path, timestamps=False)
+            self.assertIsNone(ts_send)
+            np.testing.assert_allclose(dts_us, [0.5, 1.0])
+    
+    def test_load_default_backend(self):
+        """Test loading with pandas when it is installed."""
+        self._check_backend()
+    
+    def test_load_genfromtxt_fallback(self):
+        """Test loading through the np.genfromtxt fallback."""
+        with patch("plot.pd", None):
+            self._check_backend()
+
+
+class TestPairing(unittest.TestCase):
+    """Test send/edge pairing at shutdown."""
+    
+    def test_pair_and_diff(self):
+        """Populated pairs give edge - send; any missing side gives -1."""
+        send = np.array([100, 200, 300, -1], dtype=np.int64)
+        edge = np.array([150, -1, 380, 500], dtype=np.int64)
+        
+        np.testing.assert_array_equal(pair_and_diff(send, edge), [50, -1, 80, -1])
+    
+    def test_numpy_fallback_matches(self):
+        """The np.subtract fallback agrees with the default path, misses on either side."""
+        rng = np.random.default_rng(5)
+        send = rng.integers(0, 10**9, 1000)
+        edge = send + rng.integers(1000, 10**6, 1000)
+        send[rng.random(1000) < 0.1] = -1
+        edge[rng.random(1000) < 0.1] = -1
+        
+        expected = pair_and_diff(send, edge)
+        with patch("latency_meter.njit", None):
+            fallback = pair_and_diff(send, edge)
+        
+        np.testing.assert_array_equal(fallback, expected)
+        np.testing.assert_array_equal(fallback[(send < 0) | (edge < 0)], -1)
 
 
 class TestSimulator(unittest.TestCase):
@@ -144,6 +297,50 @@ class TestSimulator(unittest.TestCase):
         self.assertGreater(mean_latency, 450)
         self.assertLess(mean_latency, 700)  # Adjusted for system overhead
     
+    def test_pulse_batch(self):
+        """Test that a pulse batch delivers one edge per pulse, in order."""
+        out_line, in_line = setup_sim_lines(mode="const", base_lat_us=200, jitter_us=0, seed=42)
+        
+        sends = out_line.pulse_batch(5, interval_ns=100_000)
+        self.assertEqual(len(sends), 5)
+        
+        edges = []
+        for _ in range(5):
+            self.assertTrue(in_line.event_wait(0.1))
+            event = in_line.event_read()
+            edges.append(event.sec * 1_000_000_000 + event.nsec)
+        
+        # Const mode: every edge lands exactly base latency after its send
+        np.testing.assert_array_equal(np.array(edges) - sends, 200_000)
+        self.assertFalse(in_line.event_wait(0.01))
+    
+    def test_event_wait_after_shutdown(self):
+        """Test that shutdown ends event_wait even when a due edge is pending."""
+        scheduler = _EdgeScheduler()
+        scheduler.schedule_edge_at(time.perf_counter_ns())
+        self.assertTrue(scheduler.event_wait(0.05))
+        
+        scheduler.shutdown()
+        self.assertFalse(scheduler.event_wait(0.05))
+    
+    def test_sharded_producers(self):
+        """Test that edges from several producers are merged in time order."""
+        out_lines, in_line = setup_sim_lines(mode="uniform", base_lat_us=200, jitter_us=100,
+                                             seed=42, nproducers=3)
+        self.assertEqual(len(out_lines), 3)
+        
+        for out_line in out_lines:
+            out_line.pulse_batch(4, interval_ns=50_000)
+        
+        edges = []
+        for _ in range(12):
+            self.assertTrue(in_line.event_wait(0.1))
+            event = in_line.event_read()
+            edges.append(event.sec * 1_000_000_000 + event.nsec)
+        
+        self.assertEqual(edges, sorted(edges))
+        self.assertFalse(in_line.event_wait(0.01))
+    
     def test_latency_model_distributions(self):
         """Test different latency distribution modes."""
         base_ns = 100000  # 100µs
@@ -167,6 +364,16 @@ class TestSimulator(unittest.TestCase):
                     # Should have some variation
                     self.assertGreater(np.std(samples), 0)
     
+    def test_batch_sampling_reproducible(self):
+        """Test that a seeded model draws the same batch every time."""
+        for mode in ["const", "uniform", "normal", "lognormal", "heavy"]:
+            with self.subTest(mode=mode):
+                first = _LatencyModel(mode, 100000, 20000, seed=42).sample_ns_batch(5)
+                second = _LatencyModel(mode, 100000, 20000, seed=42).sample_ns_batch(5)
+                
+                self.assertEqual(first.dtype, np.int64)
+                self.assertEqual(first.tobytes(), second.tobytes())
+    
     def test_distribution_info(self):
         """Test distribution information function."""
         info = get_distribution_info("lognormal", base_us=400, jitter_us=150)
@@ -214,6 +421,24 @@ class TestLatencyMeterIntegration(unittest.TestCase):
             
         finally:
             os.unlink(csv_path)
+    
+    def test_write_samples_csv(self):
+        """Test the meter's CSV writer round-trips through csv.DictReader."""
+        ts_send = np.array([1000000000, 2000000000, 3000000000], dtype=np.int64)
+        ts_edge = np.array([1000500000, 2000300000, -1], dtype=np.int64)
+        dts = np.array([500000, 300000, -1], dtype=np.int64)
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, "out.csv")
+            write_samples_csv(csv_path, ts_send, ts_edge, dts)
+            
+            with open(csv_path, newline="") as f:
+                rows = list(csv.DictReader(f))
+        
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0], {"ts_send_ns": "1000000000", "ts_edge_ns": "1000500000",
+                                   "dt_ns": "500000"})
+        self.assertEqual(rows[2], {"ts_send_ns": "3000000000", "ts_edge_ns": "", "dt_ns": ""})
 
 
 class TestSmokeTest(unittest.TestCase):